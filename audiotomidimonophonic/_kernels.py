@@ -0,0 +1,131 @@
+"""
+Numeric kernels for the MIDI extraction pipeline.
+
+With numba installed the kernels are compiled with njit(cache=True), so the
+machine code is cached on disk next to the numba cache and worker processes
+skip the per-process JIT warm-up. Without numba the same functions run
+interpreted, matching the previous behaviour.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+
+    _HAVE_NUMBA = True
+except ImportError:
+    # Numba is optional, fall back to running the kernels in the interpreter
+    _HAVE_NUMBA = False
+
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+
+        def wrap(func):
+            return func
+
+        return wrap
+
+
+@njit(cache=True)
+def segment_medians(starts, ends, values, out):
+    """
+    Compute the median of values over each segment
+
+    Parameters
+    ----------
+    starts : np.ndarray
+        Segment start indices
+    ends : np.ndarray
+        Segment end indices
+    values : np.ndarray
+        Values array
+    out : np.ndarray
+        Output array for the per-segment medians, filled in place
+    """
+
+    for i in range(len(starts)):
+        out[i] = np.median(values[starts[i] : ends[i]])
+
+
+@njit(cache=True)
+def _trim_scan(starts, ends, midi_velocity, trim_threshold):
+    """
+    Trim note boundaries with per-element scans, compiled by numba
+    """
+
+    for i in range(len(starts)):
+        start = starts[i]
+        end = ends[i]
+        while start < end and midi_velocity[start] < trim_threshold:
+            start += 1
+        while start < end and midi_velocity[end - 1] < trim_threshold:
+            end -= 1
+        starts[i] = start
+        ends[i] = end
+
+
+def _trim_argmax(starts, ends, midi_velocity, trim_threshold):
+    """
+    Trim note boundaries with a vectorized comparison and argmax per note
+    """
+
+    for i in range(len(starts)):
+        start = starts[i]
+        end = ends[i]
+        mask = midi_velocity[start:end] >= trim_threshold
+        if not mask.any():
+            starts[i] = end
+            continue
+        starts[i] = start + mask.argmax()
+        ends[i] = start + mask.size - mask[::-1].argmax()
+
+
+def trim_note_boundaries(starts, ends, midi_velocity, trim_threshold):
+    """
+    Trim note boundaries in place until the MIDI velocity is above the threshold
+
+    Uses the compiled scan when numba is available; otherwise the SIMD
+    comparison + argmax variant, which beats interpreted per-element loops.
+
+    Parameters
+    ----------
+    starts : np.ndarray
+        Note start indices, modified in place
+    ends : np.ndarray
+        Note end indices, modified in place
+    midi_velocity : np.ndarray
+        MIDI velocity array
+    trim_threshold : float
+        Threshold for trimming the note boundaries
+    """
+
+    if _HAVE_NUMBA:
+        _trim_scan(starts, ends, midi_velocity, trim_threshold)
+    else:
+        _trim_argmax(starts, ends, midi_velocity, trim_threshold)
+
+
+def warm_up():
+    """
+    Compile the numba kernels ahead of the real workload
+
+    Calling each kernel on tiny arrays triggers compilation once and fills
+    the on-disk njit cache, so worker processes spawned afterwards load the
+    cached machine code instead of paying the JIT cost per process. A no-op
+    when numba is not installed.
+    """
+
+    if not _HAVE_NUMBA:
+        return
+
+    # The dtypes here must match the midi_framework call sites exactly:
+    # values and out are the float32 feature arrays, and trim_notes casts
+    # its threshold to a Python float. A signature mismatch would leave the
+    # workers JIT-compiling their own specializations anyway
+    starts = np.array([0], dtype=np.int64)
+    ends = np.array([1], dtype=np.int64)
+    values = np.zeros(1, dtype=np.float32)
+    out = np.empty(1, dtype=np.float32)
+    segment_medians(starts, ends, values, out)
+    _trim_scan(starts, ends, values, 0.0)
@@ -2,12 +2,20 @@
 OUTPUT_DIR_NAME = "outputs"
 
 # Feature File Names
+FEATURES_PATH = "features.npz"
+MANIFEST_PATH = "manifest.json"
+
+# Legacy per-feature pickle files, still readable by load_all_features
 ONSET_ACTIVATIONS_PATH = "onset_activations.pkl"
 TIME_PATH = "time.pkl"
 FREQUENCY_PATH = "frequency.pkl"
 CONFIDENCE_PATH = "confidence.pkl"
 RMS_PATH = "rms.pkl"
 
+# Feature Extraction Parameters
+CREPE_BATCH_SIZE = 1024
+CREPE_BLOCK_SECONDS = 30
+
 # MIDI Extraction Parameters
 FPS = 100
 SEGMENT_THRESHOLD = 0.001
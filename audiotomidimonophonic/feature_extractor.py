@@ -1,11 +1,171 @@
-from .feature_utils import FeaturesExtractor
 from argparse import ArgumentParser, RawDescriptionHelpFormatter
+from functools import partial
+from multiprocessing import Pool
 from pathlib import Path
-from .fileio import create_dir_if_not_exist, save_all_features
-from .config import OUTPUT_DIR_NAME
+import hashlib
+import os
+from .fileio import (
+    create_dir_if_not_exist,
+    iter_wav_files,
+    load_json,
+    save_all_features,
+    save_json,
+)
+from .config import MANIFEST_PATH, OUTPUT_DIR_NAME
 
+try:
+    # blake3 is optional and roughly 3x faster than blake2b on the 1MB head
+    import blake3
+except ImportError:
+    blake3 = None
 
-def run(audio_dir, output_dir=None, crepe_model_capacity="full"):
+
+def _audio_content_key(path):
+    """
+    Hash the first 1MB of an audio file plus its size into a short key.
+
+    The truncated-content key is enough to tell re-encoded or replaced files
+    apart without reading whole recordings, so feature directories can be
+    reused across runs as long as the audio is unchanged.
+
+    Args:
+        path (Path): Path to the audio file
+
+    Returns:
+        str : Hex digest identifying the file contents
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        payload = f.read(1 << 20) + str(size).encode()
+    if blake3 is not None:
+        return blake3.blake3(payload).hexdigest(length=16)
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+def _write_manifest(path, file_output_dir):
+    """
+    Write the sidecar manifest recording which audio the features belong to.
+
+    Args:
+        path (Path): Path to the audio file
+        file_output_dir (Path): Feature directory of the file
+
+    Returns:
+        None
+    """
+    stat = os.stat(path)
+    save_json(
+        file_output_dir / MANIFEST_PATH,
+        {
+            "key": _audio_content_key(path),
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+        },
+    )
+
+
+def _features_are_current(path, file_output_dir):
+    """
+    Check whether extracted features still match the audio file.
+
+    Feature directories without a manifest predate the content keys and are
+    trusted as-is, keeping old feature stores usable. With a manifest, a
+    matching mtime and size skips the hash entirely; otherwise the content
+    key decides, so a simple touch does not force re-extraction.
+
+    Args:
+        path (Path): Path to the audio file
+        file_output_dir (Path): Feature directory of the file
+
+    Returns:
+        bool : True if extraction can be skipped
+    """
+    manifest_path = file_output_dir / MANIFEST_PATH
+    if not manifest_path.exists():
+        return True
+
+    try:
+        manifest = load_json(manifest_path)
+    except ValueError:
+        return False
+
+    stat = os.stat(path)
+    if manifest.get("mtime") == stat.st_mtime and manifest.get("size") == stat.st_size:
+        return True
+    if manifest.get("key") == _audio_content_key(path):
+        # Same contents, new timestamp; refresh the manifest so the next run
+        # skips on the cheap stat comparison again
+        _write_manifest(path, file_output_dir)
+        return True
+    return False
+
+
+def _init_worker(crepe_model_capacity, device="cpu", onset_backend="madmom", parallel_features=True):
+    """
+    Warm the process-wide FeaturesExtractor in a pool worker.
+
+    Loads the CREPE and madmom models once per worker process, before any
+    file is dispatched to it.
+
+    Args:
+        crepe_model_capacity (str): Model capacity of CREPE
+        device (str): Device for CREPE inference, e.g. "cpu" or "cuda:0"
+        onset_backend (str): Onset backend, "madmom" or "librosa"
+        parallel_features (bool): Overlap the per-file feature computations
+            with threads
+
+    Returns:
+        None
+    """
+    from .feature_utils import get_features_extractor
+
+    get_features_extractor(crepe_model_capacity, device, onset_backend, parallel_features)
+
+
+def _extract_one(path, output_dir, crepe_model_capacity, device="cpu", onset_backend="madmom", parallel_features=True):
+    """
+    Extract and save features for a single audio file.
+
+    Args:
+        path (Path): Path to the audio file
+        output_dir (Path): Path to the directory to save the extracted features
+        crepe_model_capacity (str): Model capacity of CREPE
+        device (str): Device for CREPE inference, e.g. "cpu" or "cuda:0"
+        onset_backend (str): Onset backend, "madmom" or "librosa"
+        parallel_features (bool): Overlap the per-file feature computations
+            with threads
+
+    Returns:
+        None
+    """
+    from .feature_utils import get_features_extractor
+
+    extractor = get_features_extractor(
+        crepe_model_capacity, device, onset_backend, parallel_features
+    )
+
+    print(f"Processing file {path.stem}")
+    file_output_dir = output_dir / path.stem
+
+    onset_activations, time, frequency, confidence, rms = extractor.get_all_features(
+        str(path)
+    )
+    save_all_features(
+        file_output_dir, onset_activations, time, frequency, confidence, rms
+    )
+    _write_manifest(path, file_output_dir)
+
+    print(f"Features saved in {file_output_dir}")
+
+
+def run(
+    audio_dir,
+    output_dir=None,
+    crepe_model_capacity="full",
+    num_workers=None,
+    device="cpu",
+    onset_backend="madmom",
+):
     """
     Extract features from audio files in a directory and save them in a new directory.
 
@@ -13,12 +173,14 @@ def run(audio_dir, output_dir=None, crepe_model_capacity="full"):
         audio_dir (Path): Path to the directory containing audio files
         output_dir (Path): Path to the directory to save the extracted features
         crepe_model_capacity (str): Model capacity of CREPE
+        num_workers (int): Number of worker processes, defaults to the CPU count
+        device (str): Device for CREPE inference, e.g. "cpu" or "cuda:0"
+        onset_backend (str): Onset backend, "madmom" or "librosa"
 
     Returns:
         None
     """
 
-    features_extractor = FeaturesExtractor(crepe_model_capacity)
     audio_dir = Path(audio_dir)
 
     if not output_dir:
@@ -30,30 +192,53 @@ def run(audio_dir, output_dir=None, crepe_model_capacity="full"):
     if audio_dir.is_file():
         wav_files = [audio_dir] if audio_dir.suffix == ".wav" else []
     else:
-        wav_files = audio_dir.rglob("*.wav")
+        wav_files = iter_wav_files(audio_dir)
+
+    # Skip files whose features are already extracted and still match the
+    # audio contents, so parameter sweeps over unchanged audio never pay for
+    # CREPE or madmom again
+    pending = []
+    for path in wav_files:
+        file_output_dir = output_dir / path.stem
+        if file_output_dir.exists() and _features_are_current(path, file_output_dir):
+            print(f"Features previously extracted in {file_output_dir}")
+        else:
+            pending.append(path)
 
     # Create output directory if it does not exist
     create_dir_if_not_exist(output_dir)
 
-    # Extract features from audio files
-    for path in wav_files:
+    # Nothing to extract, return before any worker loads the CREPE model
+    if not pending:
+        return
 
-        print(f"Processing file {path.stem}")
-        file_output_dir = output_dir / path.stem
+    if not num_workers:
+        num_workers = os.cpu_count() or 1
+    num_workers = min(num_workers, max(len(pending), 1))
 
-        # Skip if features are already extracted
-        if file_output_dir.exists():
-            print(f"Features previously extracted in {file_output_dir}")
-            continue
-
-        onset_activations, time, frequency, confidence, rms = (
-            features_extractor.get_all_features(str(path))
-        )
-        save_all_features(
-            file_output_dir, onset_activations, time, frequency, confidence, rms
+    # Extract features from audio files, in parallel across worker processes
+    # when more than one file needs processing; workers then compute their
+    # per-file features serially since file-level parallelism already keeps
+    # the cores busy
+    if num_workers > 1:
+        extract = partial(
+            _extract_one,
+            output_dir=output_dir,
+            crepe_model_capacity=crepe_model_capacity,
+            device=device,
+            onset_backend=onset_backend,
+            parallel_features=False,
         )
-
-        print(f"Features saved in {file_output_dir}")
+        with Pool(
+            processes=num_workers,
+            initializer=_init_worker,
+            initargs=(crepe_model_capacity, device, onset_backend, False),
+        ) as pool:
+            for _ in pool.imap_unordered(extract, pending):
+                pass
+    else:
+        for path in pending:
+            _extract_one(path, output_dir, crepe_model_capacity, device, onset_backend)
 
 
 def main():
@@ -83,10 +268,34 @@ def main():
         default="full",
         help="Model capacity of CREPE",
     )
+    parser.add_argument(
+        "--num_workers",
+        type=int,
+        help="Number of worker processes, defaults to the CPU count",
+    )
+    parser.add_argument(
+        "--device",
+        default="cpu",
+        help='Device for CREPE inference, e.g. "cuda:0" to use torchcrepe on GPU',
+    )
+    parser.add_argument(
+        "--onset_backend",
+        choices=["madmom", "librosa"],
+        default="madmom",
+        help="Onset backend; librosa's spectral flux is much faster than the "
+        "madmom CNN at some cost in onset quality",
+    )
 
     args = parser.parse_args()
 
-    run(args.audio_dir, args.output_dir, args.model_capacity)
+    run(
+        args.audio_dir,
+        args.output_dir,
+        args.model_capacity,
+        args.num_workers,
+        args.device,
+        args.onset_backend,
+    )
 
 
 if __name__ == "__main__":
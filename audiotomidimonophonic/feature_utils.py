@@ -1,25 +1,87 @@
 import madmom
 import crepe
 import librosa
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from .config import CREPE_BATCH_SIZE, CREPE_BLOCK_SECONDS
+
+
+@lru_cache(maxsize=1)
+def get_features_extractor(crepe_model_capacity='full', device='cpu', onset_backend='madmom', parallel_features=True):
+    """
+    Return the process-wide FeaturesExtractor for the given settings
+
+    Constructing a FeaturesExtractor loads the madmom CNN weights, so callers
+    should go through this cache instead of instantiating one per file. The
+    CREPE model itself is cached inside crepe.core.build_and_load_model.
+
+    Args:
+        crepe_model_capacity (str): Model capacity of CREPE
+        device (str): Device for CREPE inference, e.g. "cpu" or "cuda:0"
+        onset_backend (str): Onset backend, "madmom" or "librosa"
+        parallel_features (bool): Overlap the per-file feature computations
+            with threads; disable when file-level parallelism already
+            saturates the cores
+
+    Returns:
+        FeaturesExtractor : Cached extractor instance
+    """
+    return FeaturesExtractor(crepe_model_capacity, device, onset_backend, parallel_features)
 
 class FeaturesExtractor:
-    def __init__(self, crepe_model_capacity='full'):
-        self.madmom_onset_generator = madmom.features.onsets.CNNOnsetProcessor()
+    def __init__(self, crepe_model_capacity='full', device='cpu', onset_backend='madmom', parallel_features=True):
+        self.onset_backend = onset_backend
+        if onset_backend == 'madmom':
+            self.madmom_onset_generator = madmom.features.onsets.CNNOnsetProcessor()
         self.crepe_model_capacity = crepe_model_capacity
+        self.device = device
+        self.parallel_features = parallel_features
 
     def get_onset_activations(self, audio_path):
         """
-        Extract onset times from audio file using madmom
+        Extract onset activations from audio file
 
         Args:
             audio_path (str): Path to the audio file
-        
+
         Returns:
-            np array : Onset times
+            np array : Onset activations
         """
+        if self.onset_backend == 'librosa':
+            audio, sr = librosa.load(audio_path, sr=None, mono=True)
+            return self.get_onset_activations_from_array(audio, sr)
+
         onset_activations = self.madmom_onset_generator(audio_path)
         return onset_activations
-    
+
+    def get_onset_activations_from_array(self, audio, sr):
+        """
+        Extract onset activations from an in-memory audio buffer
+
+        Args:
+            audio (np array): Audio buffer
+            sr (int): Sampling rate of the buffer
+
+        Returns:
+            np array : Onset activations
+        """
+        # The spectral-flux envelope is far cheaper than the madmom CNN and
+        # comes out at the same 100fps grid
+        if self.onset_backend == 'librosa':
+            return librosa.onset.onset_strength(
+                y=audio, sr=sr, hop_length=sr // 100, aggregate=np.median
+            )
+
+        # The madmom CNN pipeline works at 44.1kHz; resample with librosa so
+        # madmom does not have to shell out for the rate conversion
+        if sr != 44100:
+            audio = librosa.resample(
+                audio, orig_sr=sr, target_sr=44100, res_type='soxr_hq'
+            )
+        signal = madmom.audio.signal.Signal(audio, sample_rate=44100)
+        return self.madmom_onset_generator(signal)
+
     def get_crepe_outputs(self, audio_path):
         """
         Extract pitch activations from audio file using crepe
@@ -33,9 +95,132 @@ class FeaturesExtractor:
             np array : Confidence
         """
         audio, sr = librosa.load(audio_path, sr=16000, mono=True)    # Crepe requires 16kHz sampling rate
-        time, frequency, confidence, _ = crepe.predict(audio, sr, viterbi=True, model_capacity=self.crepe_model_capacity)
+        return self.predict_crepe(audio)
+
+    def predict_crepe(self, audio):
+        """
+        Run CREPE on a 16kHz audio buffer with large inference batches
+
+        Frames the audio and feeds all frames to the cached CREPE model in a
+        single predict call, instead of crepe.predict's default batch size of 32.
+
+        Args:
+            audio (np array): Audio buffer sampled at 16kHz
+
+        Returns:
+            np array : Time
+            np array : Frequency
+            np array : Confidence
+        """
+        if self.device.startswith('cuda'):
+            return self._predict_torchcrepe(audio)
+
+        model = crepe.core.build_and_load_model(self.crepe_model_capacity)
+
+        audio = np.pad(audio.astype(np.float32), 512, mode='constant')
+        hop_length = 160    # 10ms at 16kHz
+        n_frames = 1 + (len(audio) - 1024) // hop_length
+
+        # Run the model block by block so the frame matrix (1024 samples per
+        # frame) never holds more than CREPE_BLOCK_SECONDS of audio at once
+        block_frames = CREPE_BLOCK_SECONDS * 100
+        activation = None
+        for block_start in range(0, n_frames, block_frames):
+            block_end = min(block_start + block_frames, n_frames)
+            frames = self._crepe_frames(audio, block_start, block_end, hop_length)
+            block_activation = model.predict(
+                frames, batch_size=CREPE_BATCH_SIZE, verbose=0
+            )
+            if activation is None:
+                activation = np.empty(
+                    (n_frames, block_activation.shape[1]),
+                    dtype=block_activation.dtype,
+                )
+            activation[block_start:block_end] = block_activation
+
+        cents = crepe.core.to_viterbi_cents(activation)
+        frequency = 10 * 2 ** (cents / 1200)
+        frequency[np.isnan(frequency)] = 0
+        confidence = activation.max(axis=1)
+        time = np.arange(confidence.shape[0]) * 0.01
+        return time, frequency, confidence
+
+    def _predict_torchcrepe(self, audio):
+        """
+        Run CREPE on a 16kHz audio buffer with torchcrepe on a CUDA device
+
+        Requires the optional torchcrepe dependency. Periodicity is returned
+        as the confidence, matching the TensorFlow CREPE output.
+
+        Args:
+            audio (np array): Audio buffer sampled at 16kHz
+
+        Returns:
+            np array : Time
+            np array : Frequency
+            np array : Confidence
+        """
+        import torch
+        import torchcrepe
+
+        if not torch.cuda.is_available():
+            print("CUDA not available, falling back to TensorFlow CREPE")
+            self.device = 'cpu'
+            return self.predict_crepe(audio)
+
+        audio_tensor = torch.from_numpy(
+            np.ascontiguousarray(audio, dtype=np.float32)
+        ).unsqueeze(0)
+        pitch, periodicity = torchcrepe.predict(
+            audio_tensor,
+            16000,
+            hop_length=160,    # 10ms at 16kHz
+            fmin=32.7,
+            fmax=1975.5,
+            model=self.crepe_model_capacity,
+            batch_size=CREPE_BATCH_SIZE,
+            device=self.device,
+            return_periodicity=True,
+        )
+
+        frequency = pitch.squeeze(0).cpu().numpy()
+        confidence = periodicity.squeeze(0).cpu().numpy()
+        time = np.arange(len(confidence)) * 0.01
         return time, frequency, confidence
-    
+
+    @staticmethod
+    def _crepe_frames(audio, frame_start, frame_end, hop_length):
+        """
+        Build normalized 1024-sample CREPE frames for a range of frame indices
+
+        Frames the padded audio into centered windows at a 10ms hop, matching
+        crepe.predict's preprocessing.
+
+        Args:
+            audio (np array): Padded audio buffer sampled at 16kHz
+            frame_start (int): Index of the first frame
+            frame_end (int): Index past the last frame
+            hop_length (int): Hop length in samples
+
+        Returns:
+            np array : Frames of shape (frame_end - frame_start, 1024)
+        """
+        sample_start = frame_start * hop_length
+        sample_end = (frame_end - 1) * hop_length + 1024
+        block = audio[sample_start:sample_end]
+
+        frames = np.lib.stride_tricks.as_strided(
+            block,
+            shape=(1024, frame_end - frame_start),
+            strides=(block.itemsize, hop_length * block.itemsize),
+        )
+        frames = frames.transpose().copy()
+
+        # Normalize each frame to zero mean and unit variance
+        frames -= np.mean(frames, axis=1)[:, np.newaxis]
+        frames /= np.clip(np.std(frames, axis=1)[:, np.newaxis], 1e-8, None)
+        return frames
+
     def get_rms_energy(self, audio_path):
         """
         Extract RMS energy from audio file using librosa
@@ -47,14 +232,44 @@ class FeaturesExtractor:
             np array : RMS energy
         """
         audio, sr = librosa.load(audio_path, sr=None, mono=True)
+        return self.get_rms_energy_from_array(audio, sr)
+
+    def get_rms_energy_from_array(self, audio, sr):
+        """
+        Extract RMS energy from an in-memory audio buffer
+
+        Computes the same windowed RMS as librosa.feature.rms with
+        center=True, but through a strided view and einsum so no squared
+        copy of the frames is allocated.
+
+        Args:
+            audio (np array): Audio buffer
+            sr (int): Sampling rate of the buffer
+
+        Returns:
+            np array : RMS energy
+        """
         hop_length = sr//100   # 10ms hop length to match pitch and onset activations
-        rms = librosa.feature.rms(y=audio, frame_length=2*hop_length, hop_length=hop_length)[0]
+        frame_length = 2*hop_length
+
+        # Zero-pad half a frame on each side, matching librosa's centering
+        padded = np.pad(audio, frame_length // 2, mode='constant')
+        frames = np.lib.stride_tricks.sliding_window_view(padded, frame_length)[
+            ::hop_length
+        ]
+        rms = np.sqrt(np.einsum('ij,ij->i', frames, frames) / frame_length)
         return rms
 
     def get_all_features(self, audio_path):
         """
         Extract all features from audio file
 
+        The audio is decoded once at its native sampling rate; onsets, RMS and
+        the 16kHz buffer for CREPE are all derived from that one buffer. With
+        parallel_features enabled the onset and RMS computations run in
+        threads while this thread runs CREPE; all three spend most of their
+        time in numpy or the inference backends, which release the GIL.
+
         Args:
             audio_path (str): Path to the audio file
 
@@ -65,8 +280,30 @@ class FeaturesExtractor:
             np array : Confidence
             np array : RMS energy
         """
-        onset_activations = self.get_onset_activations(audio_path)
-        time, frequency, confidence = self.get_crepe_outputs(audio_path)
-        rms = self.get_rms_energy(audio_path)
-        
-        return onset_activations, time, frequency, confidence, rms
\ No newline at end of file
+        audio, sr = librosa.load(audio_path, sr=None, mono=True)
+
+        if self.parallel_features:
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                onset_future = pool.submit(
+                    self.get_onset_activations_from_array, audio, sr
+                )
+                rms_future = pool.submit(self.get_rms_energy_from_array, audio, sr)
+
+                audio_16k = librosa.resample(
+                    audio, orig_sr=sr, target_sr=16000, res_type='soxr_hq'
+                )   # Crepe requires 16kHz sampling rate
+                time, frequency, confidence = self.predict_crepe(audio_16k)
+
+                onset_activations = onset_future.result()
+                rms = rms_future.result()
+            return onset_activations, time, frequency, confidence, rms
+
+        onset_activations = self.get_onset_activations_from_array(audio, sr)
+        rms = self.get_rms_energy_from_array(audio, sr)
+
+        audio_16k = librosa.resample(
+            audio, orig_sr=sr, target_sr=16000, res_type='soxr_hq'
+        )   # Crepe requires 16kHz sampling rate
+        time, frequency, confidence = self.predict_crepe(audio_16k)
+
+        return onset_activations, time, frequency, confidence, rms
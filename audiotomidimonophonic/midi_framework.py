@@ -1,7 +1,7 @@
-import pretty_midi
+import os
 import numpy as np
-import librosa
 import scipy
+from collections import namedtuple
 from .config import (
     SEGMENT_THRESHOLD,
     MIN_NOTE_DURATION,
@@ -12,16 +12,12 @@ from .config import (
     TRIM_THRESHOLD,
 )
 
+from ._kernels import segment_medians, trim_note_boundaries
 
-class Note:
-    def __init__(self, pitch, start, end, velocity):
-        self.pitch = pitch
-        self.start = start
-        self.end = end
-        self.velocity = velocity
 
-    def __repr__(self):
-        return f"Note(pitch={self.pitch}, start={self.start}, end={self.end}, velocity={self.velocity})"
+# Notes are stored as parallel arrays (structure of arrays) so the pipeline
+# stages can operate on whole arrays instead of lists of Python objects
+Notes = namedtuple("Notes", "pitch start end velocity")
 
 
 def features_to_midi(
@@ -59,6 +55,13 @@ def features_to_midi(
         MIDI object
     """
 
+    # Work in float32 throughout, halving memory traffic on these 1D signals;
+    # MIDI pitches and velocities are rounded to integers at the end anyway
+    onset_activations = np.ascontiguousarray(onset_activations, dtype=np.float32)
+    frequency = np.ascontiguousarray(frequency, dtype=np.float32)
+    confidence = np.ascontiguousarray(confidence, dtype=np.float32)
+    rms = np.ascontiguousarray(rms, dtype=np.float32)
+
     # Scale rms amplitude to [0, 127]
     midi_velocity = rms_to_velocity(rms)
 
@@ -70,7 +73,7 @@ def features_to_midi(
         confidence, pitch_gradient, segment_threshold=segment_threshold
     )
 
-    # Create Note instances
+    # Create Notes arrays
     notes = create_notes(note_segments, midi_pitch, midi_velocity)
 
     # Merge adjacent notes with similar pitch
@@ -82,10 +85,10 @@ def features_to_midi(
     )
 
     # Split Notes with strong onset activations
-    onset_activations = threshold_onset_activations(
+    onset_idx = threshold_onset_activations(
         onset_activations, onset_threshold=onset_threshold
     )
-    notes = split_notes(notes, onset_activations, min_split_duration=min_split_duration)
+    notes = split_notes(notes, onset_idx, min_split_duration=min_split_duration)
 
     # Trim Note boundaries
     notes = trim_notes(notes, midi_velocity, trim_threshold=trim_threshold)
@@ -96,6 +99,31 @@ def features_to_midi(
     return midi
 
 
+def _minmax01(x):
+    """
+    Scale an array to [0, 1] with a fused affine transform
+
+    Equivalent to np.interp(x, (x.min(), x.max()), (0, 1)) without the
+    per-element piecewise-linear search.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        Input array
+
+    Returns
+    -------
+    scaled : np.ndarray
+        Array scaled to [0, 1], or zeros if x is constant
+    """
+
+    lo = x.min()
+    hi = x.max()
+    if hi > lo:
+        return (x - lo) * (1.0 / (hi - lo))
+    return np.zeros_like(x)
+
+
 def rms_to_velocity(rms):
     """
     Convert RMS amplitude to MIDI velocity
@@ -112,8 +140,13 @@ def rms_to_velocity(rms):
     """
     rms_mean = np.mean(rms)
     rms_std = np.std(rms)
-    rms_clip = np.clip(rms, 0, rms_mean + 6 * rms_std)
-    midi_velocity = np.interp(rms_clip, (0, rms_clip.max()), (0, 127))
+    midi_velocity = np.clip(rms, 0, rms_mean + 6 * rms_std)
+
+    # Mapping (0, max) to (0, 127) is just an affine scale, so apply it in
+    # place instead of paying np.interp's per-element binary search
+    rms_peak = midi_velocity.max()
+    if rms_peak > 0:
+        midi_velocity *= 127.0 / rms_peak
     return midi_velocity
 
 
@@ -134,11 +167,15 @@ def compute_midi_pitch_and_gradient(frequency):
         Scaled pitch gradient between 0 and 1
     """
 
-    midi_pitch = librosa.hz_to_midi(frequency)
-    pitch_gradient = np.abs(np.gradient(midi_pitch))
-    pitch_gradient_scaled = np.interp(
-        pitch_gradient, (pitch_gradient.min(), pitch_gradient.max()), (0, 1)
-    )
+    # Closed form of librosa.hz_to_midi, computed with in-place ops so the
+    # frequency array is traversed once without extra temporaries
+    midi_pitch = np.log2(frequency / 440.0)
+    midi_pitch *= 12.0
+    midi_pitch += 69.0
+
+    pitch_gradient = np.gradient(midi_pitch)
+    np.abs(pitch_gradient, out=pitch_gradient)
+    pitch_gradient_scaled = _minmax01(pitch_gradient)
     return midi_pitch, pitch_gradient_scaled
 
 
@@ -165,9 +202,7 @@ def compute_note_segments(
 
     # Compute the segmentation signal
     seg_signal = (1 - confidence) * pitch_gradient
-    scaled_seg_signal = np.interp(
-        seg_signal, (seg_signal.min(), seg_signal.max()), (0, 1)
-    )
+    scaled_seg_signal = _minmax01(seg_signal)
 
     # Find boundary points and their widths
     boundary_points, _ = scipy.signal.find_peaks(
@@ -188,9 +223,37 @@ def compute_note_segments(
     return note_segments
 
 
+def _segment_maxima(starts, ends, values):
+    """
+    Compute the maximum of values over each segment in one reduceat call
+
+    Parameters
+    ----------
+    starts : np.ndarray
+        Segment start indices
+    ends : np.ndarray
+        Segment end indices, clipped to the length of values
+    values : np.ndarray
+        Values array
+
+    Returns
+    -------
+    maxima : np.ndarray
+        Per-segment maxima
+    """
+
+    # Interleave starts and ends so every other reduceat slot covers one
+    # segment; pad with -inf so an end index equal to len(values) stays valid
+    reduce_indices = np.empty(2 * len(starts), dtype=np.int64)
+    reduce_indices[0::2] = starts
+    reduce_indices[1::2] = np.minimum(ends, len(values))
+    padded = np.concatenate((values, np.array([-np.inf], dtype=values.dtype)))
+    return np.maximum.reduceat(padded, reduce_indices)[::2]
+
+
 def create_notes(note_segments, midi_pitch, midi_velocity):
     """
-    Create Note instances from note segments
+    Create Notes arrays from note segments
 
     Parameters
     ----------
@@ -203,16 +266,21 @@ def create_notes(note_segments, midi_pitch, midi_velocity):
 
     Returns
     -------
-    notes : list
-        List of Note instances
+    notes : Notes
+        Notes arrays
     """
 
-    notes = []
-    for start, end in note_segments:
-        pitch = np.median(midi_pitch[start:end])
-        velocity = np.max(midi_velocity[start:end])
-        notes.append(Note(pitch, start, end, velocity))
-    return notes
+    n = len(note_segments)
+    start = np.fromiter((s for s, _ in note_segments), np.int64, count=n)
+    end = np.fromiter((e for _, e in note_segments), np.int64, count=n)
+
+    # Match the output dtype to the values so the single kernel
+    # specialization warmed up by _kernels.warm_up covers this call
+    pitch = np.empty(n, dtype=midi_pitch.dtype)
+    segment_medians(start, end, midi_pitch, pitch)
+    velocity = _segment_maxima(start, end, midi_velocity)
+
+    return Notes(pitch, start, end, velocity)
 
 
 def merge_notes(notes):
@@ -221,37 +289,33 @@ def merge_notes(notes):
 
     Parameters
     ----------
-    notes : list
-        List of Note instances
+    notes : Notes
+        Notes arrays
 
     Returns
     -------
-    f_notes : list
-        List of merged Note instances
+    f_notes : Notes
+        Merged Notes arrays
     """
-    f_notes = []
-    comb = []
-
-    def combine_notes():
-        if len(comb) == 1:
-            f_notes.append(comb[0])
-        elif len(comb) > 1:
-            start = comb[0].start
-            end = comb[-1].end
-            pitch = np.median([note.pitch for note in comb])
-            velocity = np.max([note.velocity for note in comb])
-            f_notes.append(Note(pitch, start, end, velocity))
-
-    for n1, n2 in zip(notes, notes[1:]):
-        if np.abs(n2.pitch - n1.pitch) < 0.5:
-            comb.append(n1)
-        else:
-            comb.append(n1)
-            combine_notes()
-            comb = []
 
-    combine_notes()  # Combine the last notes if remaining
-    return f_notes
+    n = len(notes.pitch)
+    if n == 0:
+        return notes
+
+    # Runs of adjacent notes whose pitch differs by less than half a semitone
+    # are merged into one note
+    boundaries = np.flatnonzero(np.abs(np.diff(notes.pitch)) >= 0.5)
+    group_starts = np.concatenate(([0], boundaries + 1))
+    group_ends = np.concatenate((boundaries + 1, [n]))
+
+    pitch = np.empty(len(group_starts), dtype=notes.pitch.dtype)
+    segment_medians(group_starts, group_ends, notes.pitch, pitch)
+    velocity = _segment_maxima(group_starts, group_ends, notes.velocity)
+
+    start = notes.start[group_starts]
+    end = notes.end[group_ends - 1]
+
+    return Notes(pitch, start, end, velocity)
 
 
 def remove_short_quiet_notes(
@@ -262,8 +326,8 @@ def remove_short_quiet_notes(
 
     Parameters
     ----------
-    notes : list
-        List of Note instances
+    notes : Notes
+        Notes arrays
     min_note_duration : float
         Minimum duration of a note
     min_velocity : int
@@ -271,17 +335,16 @@ def remove_short_quiet_notes(
 
     Returns
     -------
-    f_notes : list
-        List of filtered Note instances
+    f_notes : Notes
+        Filtered Notes arrays
     """
 
-    f_notes = [
-        note
-        for note in notes
-        if note.end - note.start > min_note_duration * FPS
-        and note.velocity > min_velocity
-    ]
-    return f_notes
+    mask = (notes.end - notes.start > min_note_duration * FPS) & (
+        notes.velocity > min_velocity
+    )
+    return Notes(
+        notes.pitch[mask], notes.start[mask], notes.end[mask], notes.velocity[mask]
+    )
 
 
 def threshold_onset_activations(onset_activations, onset_threshold=ONSET_THRESHOLD):
@@ -297,55 +360,71 @@ def threshold_onset_activations(onset_activations, onset_threshold=ONSET_THRESHO
 
     Returns
     -------
-    onset_activations : np.ndarray
-        Thresholded onset activations
+    onset_idx : np.ndarray
+        Sorted indices of the onset peaks above the threshold
     """
 
-    onset_indices = scipy.signal.find_peaks(
+    onset_idx = scipy.signal.find_peaks(
         onset_activations, distance=4, height=onset_threshold
     )[0]
-    onset_activations = np.zeros_like(onset_activations)
-    onset_activations[onset_indices] = 1
-    return onset_activations
+    return onset_idx
 
 
-def split_notes(notes, onset_activations, min_split_duration=MIN_SPLIT_DURATION):
+def split_notes(notes, onset_idx, min_split_duration=MIN_SPLIT_DURATION):
     """
     Split Notes with strong onset activations within the note boundaries
 
     Parameters
     ----------
-    notes : list
-        List of Note instances
-    onset_activations : np.ndarray
-        Thresholded onset activations
-    min_note_duration : float
-        Minimum duration of a note
+    notes : Notes
+        Notes arrays
+    onset_idx : np.ndarray
+        Sorted indices of the thresholded onsets
+    min_split_duration : float
+        Minimum duration for splitting a note
 
     Returns
     -------
-    f_notes : list
-        List of filtered Note instances
+    f_notes : Notes
+        Split Notes arrays
     """
 
-    f_notes = []
+    pitches = []
+    starts = []
+    ends = []
+    velocities = []
+
+    # Each note finds its onsets with two binary searches into the sorted
+    # onset indices instead of scanning a dense activation array
+    for i in range(len(notes.pitch)):
+        start = notes.start[i]
+        end = notes.end[i]
 
-    for note in notes:
-        if np.any(onset_activations[note.start : note.end]):
-            split_indices = np.where(onset_activations[note.start : note.end])[0]
-            split_indices = split_indices + note.start
-            split_indices = np.append(split_indices, note.end)
-            prev_split = note.start
+        lo, hi = np.searchsorted(onset_idx, [start, end])
+        if hi > lo:
+            split_indices = np.append(onset_idx[lo:hi], end)
+            prev_split = start
 
             for split in split_indices:
                 if split - prev_split > min_split_duration * FPS:
-                    f_notes.append(Note(note.pitch, prev_split, split, note.velocity))
+                    pitches.append(notes.pitch[i])
+                    starts.append(prev_split)
+                    ends.append(split)
+                    velocities.append(notes.velocity[i])
                     prev_split = split
 
         else:
-            f_notes.append(note)
-
-    return f_notes
+            pitches.append(notes.pitch[i])
+            starts.append(start)
+            ends.append(end)
+            velocities.append(notes.velocity[i])
+
+    return Notes(
+        np.array(pitches),
+        np.array(starts, dtype=np.int64),
+        np.array(ends, dtype=np.int64),
+        np.array(velocities),
+    )
 
 
 def trim_notes(notes, midi_velocity, trim_threshold=TRIM_THRESHOLD):
@@ -354,8 +433,8 @@ def trim_notes(notes, midi_velocity, trim_threshold=TRIM_THRESHOLD):
 
     Parameters
     ----------
-    notes : list
-        List of Note instances
+    notes : Notes
+        Notes arrays
     midi_velocity : np.ndarray
         MIDI velocity array
     trim_threshold : float
@@ -363,32 +442,27 @@ def trim_notes(notes, midi_velocity, trim_threshold=TRIM_THRESHOLD):
 
     Returns
     -------
-    f_notes : list
-        List of filtered Note instances
+    f_notes : Notes
+        Trimmed Notes arrays
     """
 
-    for note in notes:
-        start = note.start
-        end = note.end
-        while start < end and midi_velocity[start] < trim_threshold:
-            start += 1
-        while start < end and midi_velocity[end - 1] < trim_threshold:
-            end -= 1
+    starts = notes.start.astype(np.int64)
+    ends = notes.end.astype(np.int64)
+    # The default TRIM_THRESHOLD is an int; cast so the kernel always sees a
+    # float threshold and compiles only the specialization warm_up covers
+    trim_note_boundaries(starts, ends, midi_velocity, float(trim_threshold))
 
-        note.start = start
-        note.end = end
-
-    return notes
+    return Notes(notes.pitch, starts, ends, notes.velocity)
 
 
 def make_midi(notes, time):
     """
-    Create a MIDI object from Note instances
+    Create a MIDI object from Notes arrays
 
     Parameters
     ----------
-    notes : list
-        List of Note instances
+    notes : Notes
+        Notes arrays
     time : np.ndarray
         Time array
 
@@ -398,27 +472,117 @@ def make_midi(notes, time):
         MIDI object
     """
 
+    # Imported here so feature extraction never pays the pretty_midi import
+    import pretty_midi
+
     midi = pretty_midi.PrettyMIDI()
     instrument = pretty_midi.Instrument(0)
-    for note in notes:
-        # Remove too short notes remaining after trimming
-        if note.end-1 <= note.start:
-            continue
-        note_instance = pretty_midi.Note(
-            velocity=int(round(note.velocity)),
-            pitch=int(round(note.pitch)),
-            start=time[note.start],
-            end=time[note.end - 1],
+
+    # Remove too short notes remaining after trimming, then round and look up
+    # the note timings with whole-array operations
+    valid = notes.end - 1 > notes.start
+    pitches = np.rint(notes.pitch[valid]).astype(int)
+    velocities = np.rint(notes.velocity[valid]).astype(int)
+    note_starts = time[notes.start[valid]]
+    note_ends = time[notes.end[valid] - 1]
+
+    instrument.notes.extend(
+        pretty_midi.Note(
+            velocity=int(velocity), pitch=int(pitch), start=start, end=end
+        )
+        for pitch, start, end, velocity in zip(
+            pitches, note_starts, note_ends, velocities
         )
-        instrument.notes.append(note_instance)
+    )
     midi.instruments.append(instrument)
     return midi
 
 
+def _write_midi_fast(midi, output_path):
+    """
+    Serialize a simple PrettyMIDI object directly through mido
+
+    PrettyMIDI.write rebuilds its tick scales and re-quantizes every event;
+    for the files this pipeline produces - one non-drum instrument, one
+    constant tempo, only notes - the seconds-to-ticks conversion is a single
+    multiplication, so the mido track is emitted directly. Anything more
+    structured is declined and left to pretty_midi.
+
+    Parameters
+    ----------
+    midi : pretty_midi.PrettyMIDI
+        MIDI object
+    output_path : str
+        Output path
+
+    Returns
+    -------
+    written : bool
+        True if the fast path handled the file
+    """
+    import mido
+
+    if (
+        len(midi.instruments) != 1
+        or midi.instruments[0].is_drum
+        or midi.instruments[0].pitch_bends
+        or midi.instruments[0].control_changes
+        or midi.time_signature_changes
+        or midi.key_signature_changes
+        or midi.lyrics
+    ):
+        return False
+    _, tempi = midi.get_tempo_changes()
+    if len(tempi) != 1:
+        return False
+
+    instrument = midi.instruments[0]
+    ticks_per_second = midi.resolution * tempi[0] / 60.0
+
+    # Sort offs ahead of ons at equal ticks, so back-to-back notes on the
+    # same pitch never overlap
+    events = []
+    for note in instrument.notes:
+        events.append((round(note.start * ticks_per_second), 1, note.pitch, note.velocity))
+        events.append((round(note.end * ticks_per_second), 0, note.pitch, 0))
+    events.sort()
+
+    track = mido.MidiTrack()
+    track.append(
+        mido.MetaMessage("set_tempo", tempo=round(6e7 / tempi[0]), time=0)
+    )
+    track.append(
+        mido.Message("program_change", program=instrument.program, time=0)
+    )
+    previous_tick = 0
+    for tick, is_on, pitch, velocity in events:
+        track.append(
+            mido.Message(
+                "note_on" if is_on else "note_off",
+                note=pitch,
+                velocity=velocity,
+                time=tick - previous_tick,
+            )
+        )
+        previous_tick = tick
+    track.append(mido.MetaMessage("end_of_track", time=0))
+
+    mido_file = mido.MidiFile(type=0, ticks_per_beat=midi.resolution)
+    mido_file.tracks.append(track)
+    mido_file.save(output_path)
+    return True
+
+
 def write_midi(midi, output_path):
     """
     Write MIDI object to a file
 
+    Single-instrument constant-tempo files take the direct mido path; the
+    rest go through PrettyMIDI.write. After the write, the file's pages are
+    dropped from the page cache where the platform supports it; MIDI outputs
+    are written once and never read back by the pipeline, so there is no
+    point letting them evict feature data in long batch runs.
+
     Parameters
     ----------
     midi : pretty_midi.PrettyMIDI
@@ -426,4 +590,13 @@ def write_midi(midi, output_path):
     output_path : str
         Output path
     """
-    midi.write(output_path)
+    output_path = str(output_path)
+    if not _write_midi_fast(midi, output_path):
+        midi.write(output_path)
+
+    if hasattr(os, "posix_fadvise"):
+        fd = os.open(output_path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
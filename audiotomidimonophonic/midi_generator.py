@@ -1,6 +1,9 @@
 from argparse import ArgumentParser, RawDescriptionHelpFormatter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
-from .fileio import load_all_features, create_dir_if_not_exist, save_json
+import os
+from .fileio import load_all_features, create_dir_if_not_exist, iter_wav_files, save_json
 from .config import (
     OUTPUT_DIR_NAME,
     SEGMENT_THRESHOLD,
@@ -10,8 +13,73 @@ from .config import (
     MIN_SPLIT_DURATION,
     TRIM_THRESHOLD,
 )
-from .midi_framework import features_to_midi
+from .midi_framework import features_to_midi, write_midi
+from ._kernels import warm_up
 from .feature_extractor import run as features_extractor_run
+from .feature_extractor import _extract_one as extract_features_one
+
+
+def _init_midi_worker():
+    """
+    Limit BLAS thread pools inside a worker process.
+
+    With one worker per core, the threads numpy's BLAS would spawn per worker
+    only oversubscribe the machine. Uses threadpoolctl when installed.
+
+    Returns:
+        None
+    """
+    try:
+        import threadpoolctl
+    except ImportError:
+        return
+    threadpoolctl.threadpool_limits(1)
+
+
+def _process_one(path, feature_dir, output_dir, no_output_subfolders, config):
+    """
+    Generate and save the MIDI file for a single audio file.
+
+    Args:
+        path (Path): Path to the audio file
+        feature_dir (Path): Path to the directory containing feature files
+        output_dir (Path): Path to the directory where the MIDI file is saved
+        no_output_subfolders (bool): Do not create a subfolder for the file
+        config (dict): MIDI extraction parameters for features_to_midi
+
+    Returns:
+        None
+    """
+
+    print(f"Generating MIDI for {path.stem}")
+
+    file_feature_dir = feature_dir / path.stem
+
+    if not file_feature_dir.exists():
+        print(f"Features not found in {file_feature_dir}")
+        # Extract directly so the FeaturesExtractor cached in this process is
+        # reused across misses, instead of re-entering the extractor runner.
+        # Feature threads stay off here: this runs inside a pool worker, and
+        # file-level parallelism already saturates the cores
+        extract_features_one(path, feature_dir, "full", parallel_features=False)
+
+    file_output_dir = output_dir if no_output_subfolders else output_dir / path.stem
+    create_dir_if_not_exist(file_output_dir)
+
+    onset_activations, time, frequency, confidence, rms = load_all_features(
+        file_feature_dir
+    )
+    midi = features_to_midi(
+        onset_activations,
+        time,
+        frequency,
+        confidence,
+        rms,
+        **config,
+    )
+    write_midi(midi, file_output_dir / f"{path.stem}.mid")
+
+    print(f"MIDI file saved in {file_output_dir}")
 
 
 def run(
@@ -25,6 +93,7 @@ def run(
     onset_threshold=ONSET_THRESHOLD,
     min_split_duration=MIN_SPLIT_DURATION,
     trim_threshold=TRIM_THRESHOLD,
+    num_workers=None,
 ):
     audio_dir = Path(audio_dir)
 
@@ -50,40 +119,7 @@ def run(
     if audio_dir.is_file():
         wav_files = [audio_dir] if audio_dir.suffix == ".wav" else []
     else:
-        wav_files = audio_dir.rglob("*.wav")
-
-    for path in wav_files:
-
-        print(f"Generating MIDI for {path.stem}")
-
-        file_feature_dir = feature_dir / path.stem
-
-        if not file_feature_dir.exists():
-            print(f"Features not found in {file_feature_dir}")
-            features_extractor_run(path, feature_dir)
-
-        file_output_dir = output_dir if no_output_subfolders else output_dir / path.stem
-        create_dir_if_not_exist(file_output_dir)
-
-        onset_activations, time, frequency, confidence, rms = load_all_features(
-            file_feature_dir
-        )
-        midi = features_to_midi(
-            onset_activations,
-            time,
-            frequency,
-            confidence,
-            rms,
-            segment_threshold=segment_threshold,
-            min_note_duration=min_note_duration,
-            min_velocity=min_velocity,
-            onset_threshold=onset_threshold,
-            min_split_duration=min_split_duration,
-            trim_threshold=trim_threshold,
-        )
-        midi.write(str(file_output_dir / f"{path.stem}.mid"))
-
-        print(f"MIDI file saved in {file_output_dir}")
+        wav_files = list(iter_wav_files(audio_dir))
 
     config = {
         "segment_threshold": segment_threshold,
@@ -93,6 +129,71 @@ def run(
         "min_split_duration": min_split_duration,
         "trim_threshold": trim_threshold,
     }
+
+    if not num_workers:
+        num_workers = os.cpu_count() or 1
+    max_workers = min(num_workers, len(wav_files))
+
+    # Generate MIDI for the audio files, in parallel across worker processes
+    # when allowed; executor.map keeps the log order
+    if max_workers > 1:
+        # Compile the numba kernels in the parent first so the workers hit
+        # the on-disk cache instead of each paying the JIT cost
+        warm_up()
+        process = partial(
+            _process_one,
+            feature_dir=feature_dir,
+            output_dir=output_dir,
+            no_output_subfolders=no_output_subfolders,
+            config=config,
+        )
+        with ProcessPoolExecutor(
+            max_workers=max_workers, initializer=_init_midi_worker
+        ) as executor:
+            list(executor.map(process, wav_files, chunksize=4))
+    elif wav_files:
+
+        def load_features(path):
+            file_feature_dir = feature_dir / path.stem
+            if not file_feature_dir.exists():
+                print(f"Features not found in {file_feature_dir}")
+                extract_features_one(path, feature_dir, "full")
+            return load_all_features(file_feature_dir)
+
+        def write_one(midi, file_output_dir, stem):
+            write_midi(midi, file_output_dir / f"{stem}.mid")
+            print(f"MIDI file saved in {file_output_dir}")
+
+        # Single-process path as a three-stage pipeline: a loader thread
+        # prefetches the next file's features and a writer thread saves the
+        # previous file's MIDI while this thread converts the current one.
+        # Waiting on the previous write before submitting the next bounds the
+        # pipeline to one MIDI object in flight and surfaces write errors
+        with ThreadPoolExecutor(max_workers=1) as prefetcher, ThreadPoolExecutor(
+            max_workers=1
+        ) as writer:
+            future = prefetcher.submit(load_features, wav_files[0])
+            write_future = None
+            for i, path in enumerate(wav_files):
+                features = future.result()
+                if i + 1 < len(wav_files):
+                    future = prefetcher.submit(load_features, wav_files[i + 1])
+
+                print(f"Generating MIDI for {path.stem}")
+                file_output_dir = (
+                    output_dir if no_output_subfolders else output_dir / path.stem
+                )
+                create_dir_if_not_exist(file_output_dir)
+
+                midi = features_to_midi(*features, **config)
+
+                if write_future is not None:
+                    write_future.result()
+                write_future = writer.submit(write_one, midi, file_output_dir, path.stem)
+
+            if write_future is not None:
+                write_future.result()
+
     # Save config
     save_json(output_dir / "config.json", config)
 
@@ -160,6 +261,11 @@ def main():
         default=TRIM_THRESHOLD,
         help="Threshold for trimming the note boundaries",
     )
+    parser.add_argument(
+        "--num_workers",
+        type=int,
+        help="Number of worker processes, defaults to the CPU count",
+    )
 
     args = parser.parse_args()
 
@@ -174,6 +280,7 @@ def main():
         args.onset_threshold,
         args.min_split_duration,
         args.trim_threshold,
+        args.num_workers,
     )
 
 